@@ -2,13 +2,18 @@ import os
 import asyncio
 import time
 import smtplib
+import socket
 from email.message import EmailMessage
+from email.utils import make_msgid
 from dotenv import load_dotenv, find_dotenv
 
 # Third-party libraries
 import gspread
 from google.oauth2.service_account import Credentials
 from imap_tools import MailBox
+from imap_tools.errors import MailboxLoginError
+
+from sheet_writeback import SheetStatusWriter
 
 # 1. SETUP & ENVIRONMENT
 load_dotenv(find_dotenv())
@@ -27,6 +32,18 @@ SHEET_NAME = get_env_var("GOOGLE_SHEET_NAME")
 WORKSHEET_NAME = get_env_var("GOOGLE_WORKSHEET_NAME")
 CREDENTIALS_FILE = "decisive-coda-477814-g9-19c85fd06150.json"  # Path to your Google Service Account JSON
 
+# Errors that mean the IMAP account or host is unusable rather than one bad
+# row. The batch stops on these instead of failing every remaining row.
+ACCOUNT_ERRORS = (
+    MailboxLoginError,
+    ConnectionError,
+    TimeoutError,
+    socket.gaierror,
+)
+
+# Stop the batch after this many failed rows in a row, whatever the error
+MAX_CONSECUTIVE_FAILURES = 5
+
 
 def generate_fixed_email_content(row_data):
     """Generate fixed email content based on row data"""
@@ -71,8 +88,7 @@ Syed Murtaza Hassam"""
 
 
 # 3. GOOGLE SHEETS FETCHING
-def fetch_sheet_data():
-    print(f"Fetching data from Google Sheet URL...")
+def open_worksheet():
     scopes = [
         "https://www.googleapis.com/auth/spreadsheets",
         "https://www.googleapis.com/auth/drive"
@@ -82,6 +98,13 @@ def fetch_sheet_data():
 
     spreadsheet = client.open_by_url(SHEET_NAME)
     sheet = spreadsheet.worksheet(WORKSHEET_NAME)
+    return sheet
+
+
+def fetch_sheet_data(sheet=None):
+    print(f"Fetching data from Google Sheet URL...")
+    if sheet is None:
+        sheet = open_worksheet()
     return sheet.get_all_records()
 
 # 4. IMAP DRAFT CREATION
@@ -93,6 +116,7 @@ def save_to_drafts(recipient_email, subject, body):
     msg['Subject'] = subject
     msg['From'] = IMAP_USER
     msg['To'] = recipient_email
+    msg['Message-ID'] = make_msgid()
     msg.set_content(body)
 
     # Add all attachments
@@ -130,11 +154,13 @@ def save_to_drafts(recipient_email, subject, body):
             msg.as_bytes()
         )
     print(f"Successfully saved to {target_folder}.")
+    return msg['Message-ID']
 
 # 5. MAIN ORCHESTRATION
 async def main():
     try:
-        rows = fetch_sheet_data()
+        sheet = open_worksheet()
+        rows = fetch_sheet_data(sheet)
         print(f"Found {len(rows)} rows to process.")
 
         # Process first 1000 rows as a batch (or all if less than 1000)
@@ -143,18 +169,20 @@ async def main():
 
         print(f"Processing batch of {len(batch_rows)} rows...")
 
-        for i, row in enumerate(batch_rows, 1):
-            print(f"\nProcessing row {i}/{len(batch_rows)}: {row.get('channel')}")
-
-            # 1. Generate Fixed Content (no AI)
-            try:
-                subject, body = generate_fixed_email_content(row)
-            except Exception as e:
-                print(f"  Content generation failed: {e}")
-                # Fallback to basic template
-                name = row.get("name", "Creator")
-                subject = f"Collaboration Opportunity with {name}"
-                body = f"""Hi {name},
+        drafted = failed = consecutive_failures = 0
+        with SheetStatusWriter(sheet) as status_writer:
+            for i, row in enumerate(batch_rows, 1):
+                print(f"\nProcessing row {i}/{len(batch_rows)}: {row.get('channel')}")
+
+                # 1. Generate Fixed Content (no AI)
+                try:
+                    subject, body = generate_fixed_email_content(row)
+                except Exception as e:
+                    print(f"  Content generation failed: {e}")
+                    # Fallback to basic template
+                    name = row.get("name", "Creator")
+                    subject = f"Collaboration Opportunity with {name}"
+                    body = f"""Hi {name},
 
 I hope this message finds you well! I've been following your YouTube channel '{row.get('channel')}' and love your content in the {row.get('catagory')} space.
 
@@ -163,13 +191,27 @@ I'd love to discuss a potential collaboration opportunity that could benefit bot
 Best regards,
 Team Automation"""
 
-            # 2. Save Draft
-            save_to_drafts(row['email'], subject, body)
-
-            # Wait 2 seconds to avoid rate limits
-            time.sleep(2)
-
-        print("\nAll drafts processed successfully!")
+                # 2. Save Draft, recording the outcome for the sheet write-back
+                try:
+                    message_id = save_to_drafts(row['email'], subject, body)
+                except Exception as e:
+                    print(f"  Draft failed: {e}")
+                    status_writer.record(i - 1, "failed", error=e)
+                    failed += 1
+                    consecutive_failures += 1
+                    if isinstance(e, ACCOUNT_ERRORS) or consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+                        print(f"CRITICAL ERROR: stopping batch at row {i}: {e}")
+                        break
+                else:
+                    status_writer.record(i - 1, "drafted", message_id=message_id)
+                    drafted += 1
+                    consecutive_failures = 0
+
+                # Wait 2 seconds to avoid rate limits
+                time.sleep(2)
+
+        print(f"\nBatch of {len(batch_rows)} drafts: {drafted} drafted, {failed} failed, "
+              f"{len(batch_rows) - drafted - failed} not processed.")
 
     except Exception as e:
         print(f"CRITICAL ERROR: {e}")
@@ -2,6 +2,7 @@ import os
 import asyncio
 import time
 import smtplib
+import socket
 import mimetypes
 from email.message import EmailMessage
 from email.utils import formatdate, make_msgid
@@ -12,6 +13,8 @@ import gspread
 from google.oauth2.service_account import Credentials
 from imap_tools import MailBox
 
+from sheet_writeback import SheetStatusWriter
+
 # 1. SETUP & ENVIRONMENT
 load_dotenv(find_dotenv())
 
@@ -47,6 +50,20 @@ SAVE_TO_SENT = os.getenv("SAVE_TO_SENT", "1").strip().lower() in {"1", "true", "
 if SAVE_TO_SENT:
     print(f"Will save a copy to IMAP folder: {SENT_FOLDER}")
 
+# Errors that mean the mail account or host is unusable rather than one bad
+# recipient. The batch stops on these instead of failing every remaining row.
+ACCOUNT_ERRORS = (
+    smtplib.SMTPAuthenticationError,
+    smtplib.SMTPConnectError,
+    smtplib.SMTPServerDisconnected,
+    ConnectionError,
+    TimeoutError,
+    socket.gaierror,
+)
+
+# Stop the batch after this many failed rows in a row, whatever the error
+MAX_CONSECUTIVE_FAILURES = 5
+
 # IMPORTANT: if EMAIL_SEND_DRY_RUN=1, nothing is sent and nothing is saved.
 
 # Dry run (default enabled)
@@ -113,8 +130,7 @@ def generate_fixed_email_content(row_data):
 
 
 # 3. GOOGLE SHEETS FETCHING
-def fetch_sheet_data():
-    print("Fetching data from Google Sheet URL...")
+def open_worksheet():
     scopes = [
         "https://www.googleapis.com/auth/spreadsheets",
         "https://www.googleapis.com/auth/drive",
@@ -124,6 +140,13 @@ def fetch_sheet_data():
 
     spreadsheet = client.open_by_url(SHEET_NAME)
     sheet = spreadsheet.worksheet(WORKSHEET_NAME)
+    return sheet
+
+
+def fetch_sheet_data(sheet=None):
+    print("Fetching data from Google Sheet URL...")
+    if sheet is None:
+        sheet = open_worksheet()
     return sheet.get_all_records()
 
 
@@ -223,7 +246,7 @@ def send_email(recipient_email, subject, body):
         preview = msg.as_string()
         print(preview[:800] + ("..." if len(preview) > 800 else ""))
         print("--- END PREVIEW ---\n")
-        return
+        return msg["Message-ID"]
 
     with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT) as server:
         server.login(SMTP_USER, SMTP_PASS)
@@ -234,31 +257,39 @@ def send_email(recipient_email, subject, body):
     if SAVE_TO_SENT:
         _append_to_sent(msg)
 
+    return msg["Message-ID"]
+
 
 # 5. MAIN ORCHESTRATION
 async def main():
     try:
-        rows = fetch_sheet_data()
+        sheet = open_worksheet()
+        rows = fetch_sheet_data(sheet)
         print(f"Found {len(rows)} rows to process.")
 
+        # Dry runs must not touch the sheet either, so only print the status updates
+        status_writer = SheetStatusWriter(sheet, dry_run=DRY_RUN)
+
         # Process first 1000 rows as a batch (or all if less than 1000)
         batch_size = min(1000, len(rows))
         batch_rows = rows[:batch_size]
 
         print(f"Processing batch of {len(batch_rows)} rows...")
 
-        for i, row in enumerate(batch_rows, 1):
-            print(f"\nProcessing row {i}/{len(batch_rows)}: {row.get('name')}")
-
-            # 1. Generate Fixed Content (no AI)
-            try:
-                subject, body = generate_fixed_email_content(row)
-            except Exception as e:
-                print(f"  Content generation failed: {e}")
-                # Fallback to basic template
-                name = row.get("name", "Creator")
-                subject = f"Collaboration Opportunity with {name}"
-                body = f"""Hi {name},
+        sent = failed = consecutive_failures = 0
+        with status_writer:
+            for i, row in enumerate(batch_rows, 1):
+                print(f"\nProcessing row {i}/{len(batch_rows)}: {row.get('name')}")
+
+                # 1. Generate Fixed Content (no AI)
+                try:
+                    subject, body = generate_fixed_email_content(row)
+                except Exception as e:
+                    print(f"  Content generation failed: {e}")
+                    # Fallback to basic template
+                    name = row.get("name", "Creator")
+                    subject = f"Collaboration Opportunity with {name}"
+                    body = f"""Hi {name},
 
 I hope this message finds you well! I've been following your YouTube channel '{row.get('channel')}' and love your content in the {row.get('catagory')} space.
 
@@ -267,13 +298,27 @@ I'd love to discuss a potential collaboration opportunity that could benefit bot
 Best regards,
 Team Automation"""
 
-            # 2. Send Email
-            send_email(row.get("email"), subject, body)
+                # 2. Send Email, recording the outcome for the sheet write-back
+                try:
+                    message_id = send_email(row.get("email"), subject, body)
+                except Exception as e:
+                    print(f"  Send failed: {e}")
+                    status_writer.record(i - 1, "failed", error=e)
+                    failed += 1
+                    consecutive_failures += 1
+                    if isinstance(e, ACCOUNT_ERRORS) or consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+                        print(f"CRITICAL ERROR: stopping batch at row {i}: {e}")
+                        break
+                else:
+                    status_writer.record(i - 1, "dry-run" if DRY_RUN else "sent", message_id=message_id)
+                    sent += 1
+                    consecutive_failures = 0
 
-            # Wait 2 seconds to avoid rate limits
-            time.sleep(2)
+                # Wait 2 seconds to avoid rate limits
+                time.sleep(2)
 
-        print(f"\nBatch of {len(batch_rows)} emails processed successfully!")
+        print(f"\nBatch of {len(batch_rows)} emails: {sent} sent, {failed} failed, "
+              f"{len(batch_rows) - sent - failed} not processed.")
 
     except Exception as e:
         print(f"CRITICAL ERROR: {e}")
@@ -0,0 +1,213 @@
+import time
+from datetime import datetime, timezone
+
+try:
+    from google.auth.exceptions import TransportError
+except ImportError:
+    # The writer only needs a worksheet-like object; without google-auth
+    # there is no token refresh that could raise this
+    TransportError = ()
+
+# Columns appended to the source sheet to record what happened to each row
+STATUS_COLUMNS = ["Status", "Message-ID", "Processed At", "Error"]
+
+# get_all_records() skips the header, so record i lives on sheet row i + 2
+FIRST_DATA_ROW = 2
+
+# Upper bound on how long record() holds off flushing after failed flushes
+MAX_COOLDOWN = 600.0
+
+
+def _column_letter(col):
+    """Convert a 1-based column number to its A1 letter (1 -> A, 28 -> AB)"""
+    letters = ""
+    while col > 0:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _is_transient(error):
+    # gspread's APIError carries the HTTP response. Quota (429) and server-side
+    # errors are worth retrying; anything else (bad request, no edit permission,
+    # sheet not found) will fail the same way again.
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    # Connection and timeout errors (both the builtin ones and requests') are
+    # OSError subclasses; a failed token refresh raises google-auth's TransportError
+    return isinstance(error, (OSError, TransportError))
+
+
+def _retry_after(error):
+    """Seconds from the Retry-After header of a failed API response, if any"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return None
+
+
+class SheetStatusWriter:
+    """Buffer per-row outcomes and write them back with one batch_update per flush.
+
+    Outcomes are keyed by row, so repeated updates to the same row coalesce
+    into a single cell write. The thresholds are checked whenever a row is
+    recorded: a flush happens once max_pending rows are buffered or the
+    oldest pending one is at least max_wait seconds old. close() flushes
+    whatever is left.
+
+    Transient failures (429, 5xx, connection errors) are retried with
+    exponential backoff, honouring Retry-After. If a flush still fails, the
+    outcomes stay buffered and record() holds off flushing for a cooldown
+    that doubles with each consecutive failure. A permanent failure (e.g. the
+    account has no edit access) disables the write-back for the rest of the
+    batch. With dry_run=True nothing is written; flushes print the updates.
+    """
+
+    def __init__(self, worksheet, max_pending=50, max_wait=30.0, max_retries=3,
+                 backoff=1.0, dry_run=False, sleep=time.sleep, clock=time.monotonic):
+        self.worksheet = worksheet
+        self.max_pending = max_pending
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.dry_run = dry_run
+        self._sleep = sleep
+        self._clock = clock
+        self._pending = {}
+        self._oldest = None
+        self._columns = None
+        self._header_updates = []
+        self._failures = 0
+        self._next_attempt = 0.0
+        self._fatal_error = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _resolve_columns(self):
+        # Read the header once; any missing status column is appended after
+        # the last existing one and written as part of the next flush.
+        header = self._call_with_retries(self.worksheet.row_values, 1)
+        columns = {}
+        header_updates = []
+        next_col = len(header) + 1
+        for name in STATUS_COLUMNS:
+            if name in header:
+                columns[name] = header.index(name) + 1
+            else:
+                columns[name] = next_col
+                header_updates.append(
+                    {"range": f"{_column_letter(next_col)}1", "values": [[name]]}
+                )
+                next_col += 1
+
+        # Sheets created from a CSV import often have no spare columns, and
+        # writing past the grid is rejected, so grow it before the first write
+        col_count = getattr(self.worksheet, "col_count", None)
+        if col_count is not None and next_col - 1 > col_count:
+            self._call_with_retries(self.worksheet.add_cols, next_col - 1 - col_count)
+        self._columns = columns
+        self._header_updates = header_updates
+
+    def _call_with_retries(self, func, *args, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.max_retries or not _is_transient(e):
+                    raise
+                delay = self.backoff * (2 ** attempt)
+                retry_after = _retry_after(e)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                print(f"  Sheet write-back failed ({e}), retrying in {delay:.1f}s...")
+                self._sleep(delay)
+
+    def record(self, row_index, status, message_id="", error=""):
+        """Buffer the outcome for the 0-based record index returned by fetch_sheet_data"""
+        self._pending[row_index] = {
+            "Status": status,
+            "Message-ID": message_id or "",
+            "Processed At": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC"),
+            "Error": str(error) if error else "",
+        }
+        now = self._clock()
+        if self._oldest is None:
+            self._oldest = now
+
+        if self._fatal_error is not None or now < self._next_attempt:
+            return
+        if len(self._pending) >= self.max_pending or now - self._oldest >= self.max_wait:
+            self.flush()
+
+    def _build_updates(self, pending):
+        updates = list(self._header_updates)
+        for row_index, outcome in sorted(pending.items()):
+            sheet_row = row_index + FIRST_DATA_ROW
+            for name in STATUS_COLUMNS:
+                updates.append({
+                    "range": f"{_column_letter(self._columns[name])}{sheet_row}",
+                    "values": [[outcome[name]]],
+                })
+        return updates
+
+    def _print_dry_run(self, pending):
+        print(f"  DRY RUN — would write status for {len(pending)} row(s) back to sheet:")
+        for row_index, outcome in sorted(pending.items()):
+            details = ", ".join(f"{name}={outcome[name]!r}" for name in STATUS_COLUMNS if outcome[name])
+            print(f"    row {row_index + FIRST_DATA_ROW}: {details}")
+
+    def flush(self):
+        """Write all pending outcomes in a single batch_update call. Returns True on success."""
+        if not self._pending:
+            return True
+        if self._fatal_error is not None:
+            return False
+
+        pending = self._pending
+        self._pending = {}
+        self._oldest = None
+
+        if self.dry_run:
+            self._print_dry_run(pending)
+            return True
+
+        try:
+            if self._columns is None:
+                self._resolve_columns()
+            updates = self._build_updates(pending)
+            self._call_with_retries(self.worksheet.batch_update, updates, value_input_option="RAW")
+        except Exception as e:
+            # Keep the failed outcomes, letting anything recorded since take precedence
+            pending.update(self._pending)
+            self._pending = pending
+            self._oldest = self._clock()
+
+            if not _is_transient(e):
+                self._fatal_error = e
+                print(f"  WARNING: Sheet write-back disabled, {len(pending)} status row(s) not written: {e}")
+                return False
+
+            self._failures += 1
+            cooldown = min(self.max_wait * 2 ** (self._failures - 1), MAX_COOLDOWN)
+            self._next_attempt = self._clock() + cooldown
+            print(f"  WARNING: Could not write {len(pending)} status row(s) back to sheet: {e}")
+            print(f"  Will try again in {cooldown:.0f}s")
+            return False
+
+        self._header_updates = []
+        self._failures = 0
+        self._next_attempt = 0.0
+        print(f"  Wrote status for {len(pending)} row(s) back to sheet")
+        return True
+
+    def close(self):
+        if not self.flush():
+            print(f"  WARNING: {len(self._pending)} status row(s) were not written back to sheet")
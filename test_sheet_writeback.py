@@ -0,0 +1,204 @@
+import math
+from types import SimpleNamespace
+
+import pytest
+
+from sheet_writeback import SheetStatusWriter, _column_letter
+
+
+class LocalAPIError(Exception):
+    """Stand-in for gspread's APIError, with a response carrying status_code and headers"""
+
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"Simulated Sheets API error [{status_code}]")
+        headers = {} if retry_after is None else {"Retry-After": str(retry_after)}
+        self.response = SimpleNamespace(status_code=status_code, headers=headers)
+
+
+class LocalWorksheet:
+    """In-memory stand-in for a gspread Worksheet.
+
+    Supports just the calls SheetStatusWriter makes and counts batch_update
+    calls. Like a real sheet it has a fixed number of columns, and writes past
+    them are rejected. Exceptions in `errors` are raised, in order, by the
+    first batch_update calls.
+    """
+
+    def __init__(self, header=None, errors=None, col_count=26):
+        self.cells = {}
+        self.batch_update_calls = 0
+        self.errors = list(errors or [])
+        self.col_count = col_count
+        for col, name in enumerate(header or [], 1):
+            self.cells[f"{_column_letter(col)}1"] = name
+
+    def row_values(self, row):
+        values = []
+        col = 1
+        while f"{_column_letter(col)}{row}" in self.cells:
+            values.append(self.cells[f"{_column_letter(col)}{row}"])
+            col += 1
+        return values
+
+    def add_cols(self, cols):
+        self.col_count += cols
+
+    def batch_update(self, data, value_input_option="RAW"):
+        self.batch_update_calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        limit = _column_letter(self.col_count)
+        for item in data:
+            col = item["range"].rstrip("0123456789")
+            if (len(col), col) > (len(limit), limit):
+                raise LocalAPIError(400)
+        for item in data:
+            self.cells[item["range"]] = item["values"][0][0]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_writer(worksheet, clock, **kwargs):
+    return SheetStatusWriter(worksheet, sleep=clock.sleep, clock=clock, **kwargs)
+
+
+def test_calls_grow_with_flushes_not_rows():
+    clock = FakeClock()
+    sheet = LocalWorksheet(header=["name", "email"])
+    with make_writer(sheet, clock, max_pending=10) as writer:
+        for i in range(95):
+            writer.record(i, "sent", message_id=f"<{i}@example.com>")
+
+    assert sheet.batch_update_calls == math.ceil(95 / 10)
+    assert sheet.cells["C2"] == "sent"
+    assert sheet.cells["D96"] == "<94@example.com>"
+
+
+def test_missing_status_columns_are_appended_to_header():
+    clock = FakeClock()
+    sheet = LocalWorksheet(header=["name", "Status"])
+    with make_writer(sheet, clock) as writer:
+        writer.record(0, "sent")
+
+    assert sheet.row_values(1) == ["name", "Status", "Message-ID", "Processed At", "Error"]
+    assert sheet.cells["B2"] == "sent"
+
+
+def test_grid_is_grown_for_status_columns():
+    clock = FakeClock()
+    sheet = LocalWorksheet(header=["name", "email"], col_count=2)
+    with make_writer(sheet, clock) as writer:
+        writer.record(0, "sent")
+
+    assert sheet.col_count == 6
+    assert sheet.batch_update_calls == 1
+    assert sheet.cells["C2"] == "sent"
+
+
+def test_repeated_rows_coalesce():
+    clock = FakeClock()
+    sheet = LocalWorksheet(header=["name"])
+    with make_writer(sheet, clock, max_pending=2) as writer:
+        writer.record(0, "sent", message_id="<a@example.com>")
+        writer.record(0, "failed", error="boom")
+
+    assert sheet.batch_update_calls == 1
+    assert sheet.cells["B2"] == "failed"
+    assert sheet.cells["C2"] == ""
+    assert sheet.cells["E2"] == "boom"
+
+
+def test_flushes_when_oldest_row_is_due():
+    clock = FakeClock()
+    sheet = LocalWorksheet(header=["name"])
+    writer = make_writer(sheet, clock, max_pending=100, max_wait=30)
+    writer.record(0, "sent")
+    clock.now = 31
+    writer.record(1, "sent")
+
+    assert sheet.batch_update_calls == 1
+
+
+def test_transient_errors_retry_with_backoff_and_retry_after():
+    clock = FakeClock()
+    sheet = LocalWorksheet(errors=[LocalAPIError(503), LocalAPIError(429, retry_after=20)])
+    writer = make_writer(sheet, clock, backoff=1.0)
+    writer.record(0, "sent")
+
+    assert writer.flush()
+    assert sheet.batch_update_calls == 3
+    assert clock.sleeps == [1.0, 20.0]
+
+
+def test_outcomes_survive_failed_flush():
+    clock = FakeClock()
+    sheet = LocalWorksheet(errors=[ConnectionError("offline")] * 4)
+    writer = make_writer(sheet, clock, max_retries=3)
+    writer.record(0, "sent", message_id="<a@example.com>")
+
+    assert not writer.flush()
+    assert writer.flush()
+    assert sheet.cells["A2"] == "sent"
+    assert sheet.cells["B2"] == "<a@example.com>"
+
+
+def test_outage_does_not_retry_on_every_row():
+    clock = FakeClock()
+    sheet = LocalWorksheet(errors=[LocalAPIError(503)] * 1000)
+    writer = make_writer(sheet, clock, max_pending=10, max_wait=30, max_retries=3)
+    for i in range(500):
+        writer.record(i, "sent")
+        clock.now += 0.01
+
+    # One full retry cycle when the first flush is due; the cooldown holds off
+    # further attempts instead of retrying once per recorded row.
+    assert sheet.batch_update_calls == 4
+    assert sum(clock.sleeps) == 1 + 2 + 4
+
+    clock.now += 30
+    writer.record(500, "sent")
+    assert sheet.batch_update_calls == 8
+
+
+def test_permanent_error_disables_write_back():
+    clock = FakeClock()
+    sheet = LocalWorksheet(errors=[LocalAPIError(403)])
+    writer = make_writer(sheet, clock, max_pending=1)
+    for i in range(50):
+        writer.record(i, "sent")
+    writer.close()
+
+    assert sheet.batch_update_calls == 1
+    assert clock.sleeps == []
+
+
+def test_dry_run_does_not_touch_sheet(capsys):
+    clock = FakeClock()
+    sheet = LocalWorksheet(header=["name"])
+    with make_writer(sheet, clock, dry_run=True) as writer:
+        writer.record(0, "dry-run", message_id="<a@example.com>")
+
+    assert sheet.batch_update_calls == 0
+    assert "DRY RUN" in capsys.readouterr().out
+
+
+def test_token_refresh_transport_error_is_transient():
+    exceptions = pytest.importorskip("google.auth.exceptions")
+    clock = FakeClock()
+    sheet = LocalWorksheet(errors=[exceptions.TransportError("token refresh failed")])
+    writer = make_writer(sheet, clock)
+    writer.record(0, "sent")
+
+    assert writer.flush()
+    assert sheet.batch_update_calls == 2